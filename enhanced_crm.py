@@ -1,56 +1,222 @@
+import io
+import re
 import sqlite3
-from contextlib import closing
 from datetime import datetime, date, time
+from functools import lru_cache
+from itertools import chain
+from pathlib import Path
 import pandas as pd
 import streamlit as st
 import uuid
 import random
 import os
+import threading
 
 # Use absolute path for database to ensure persistence
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "enhanced_leads.db")
 
 STATUSES = ["New", "Contacted", "Qualified", "In Progress", "Won", "Lost", "Closed"]
 SOURCES = ["Website", "Referral", "Email", "Phone", "Social", "Event", "Other"]
+# CSS badge class for each status
+STATUS_CLASS = {s: f"status-{s.lower().replace(' ', '-')}" for s in STATUSES}
+# Searchable columns joined into one string, so a non-word query needs a single LIKE
+SEARCH_TEXT_SQL = " || char(10) || ".join(
+    f"coalesce({c}, '')"
+    for c in ["name", "email", "place", "owner", "tags", "notes", "ref_number", "full_address"]
+)
+# Leads rendered per page in the Leads tab
+PAGE_SIZE = 25
+# Sort choices of the Leads tab; anything else passed as order_by falls back to newest first
+ORDER_OPTIONS = {
+    "Newest First": "created_at DESC",
+    "Oldest First": "created_at ASC",
+    "Highest Value": "value DESC",
+    "Lowest Value": "value ASC",
+    "Name A-Z": "name ASC",
+    "Name Z-A": "name DESC"
+}
+SCHEDULE_ORDER = "preferred_date IS NULL, preferred_date, preferred_time"
+ALLOWED_ORDERS = {*ORDER_OPTIONS.values(), SCHEDULE_ORDER}
+# Sorts paged by seeking past the previous page's last (created_at, id) instead of OFFSET
+KEYSET_ORDERS = {"created_at DESC": "<", "created_at ASC": ">"}
+# Columns written by add_lead and the CSV import, in INSERT order
+INSERT_COLUMNS = [
+    "ref_number", "name", "email", "phone", "place", "street_address", "city", "state",
+    "zip_code", "country", "full_address", "source", "owner", "status", "value", "tags",
+    "notes", "preferred_date", "preferred_time", "created_at", "updated_at"
+]
+# Cities and matching states cycled through by the sample data generator
+SAMPLE_CITIES = ["New York", "Los Angeles", "Chicago", "Houston", "Phoenix"]
+SAMPLE_STATES = ["NY", "CA", "IL", "TX", "AZ"]
+# Alternative CSV column names accepted by the importer
+IMPORT_COLUMN_ALIASES = {
+    "company": "place",
+    "address": "street_address",
+    "street": "street_address",
+    "postal_code": "zip_code",
+    "postcode": "zip_code",
+    "zip": "zip_code"
+}
+# CSV columns the importer parses; anything else in the file is skipped by read_csv
+IMPORT_CSV_COLUMNS = {*INSERT_COLUMNS, *IMPORT_COLUMN_ALIASES}
+ADDRESS_FIELDS = ["street_address", "city", "state", "zip_code", "country"]
+# full_address: the non-empty address parts joined with ", ", computed by SQLite
+FULL_ADDRESS_SQL = "rtrim(" + " || ".join(f"coalesce(nullif({f}, '') || ', ', '')" for f in ADDRESS_FIELDS) + ", ', ')"
+# Hot statements kept as constants so every call reuses the connection's prepared statement.
+# Inserts bind one value per INSERT_COLUMNS entry; a blank full_address is built from the parts.
+INSERT_LEAD_SQL = (
+    f"INSERT INTO leads ({', '.join(INSERT_COLUMNS)}) "
+    f"SELECT {', '.join(f'coalesce(nullif(full_address, {chr(39) * 2}), {FULL_ADDRESS_SQL})' if c == 'full_address' else c for c in INSERT_COLUMNS)} "
+    f"FROM (SELECT {', '.join(f'? AS {c}' for c in INSERT_COLUMNS)})"
+)
+DELETE_LEAD_SQL = "DELETE FROM leads WHERE id=?"
+# Columns of the Leads tab table; the selected lead is then loaded in full
+LIST_COLUMNS = ["id", "ref_number", "name", "place", "status", "value", "created_at"]
+# Columns the Schedule tab displays
+SCHEDULE_COLUMNS = [
+    "id", "ref_number", "name", "email", "phone", "full_address",
+    "status", "owner", "preferred_date", "preferred_time"
+]
 
 # ---------- Helpers ----------
 def _now():
     return datetime.utcnow().isoformat(timespec="seconds")
 
-def _generate_ref():
-    """Generate reference in format GDC-XX-DDMMYYYY"""
-    today = datetime.now()
-    random_numbers = f"{random.randint(10, 99):02d}"
-    date_part = today.strftime("%d%m%Y")
-    return f"GDC-{random_numbers}-{date_part}"
+def _bulk_refs(n, conn):
+    """Generate n distinct GDC-XX-DDMMYYYY references sharing a single date stamp, skipping ones already stored"""
+    date_part = datetime.now().strftime("%d%m%Y")
+    taken = {ref for ref, in conn.execute("SELECT ref_number FROM leads WHERE ref_number LIKE ?", (f"GDC-%-{date_part}",))}
+    # A batch inserts all or nothing, so refs must not collide; past 90 a day they get wider numbers
+    upper = 100
+    while True:
+        free = [ref for ref in (f"GDC-{r}-{date_part}" for r in range(10, upper)) if ref not in taken]
+        if len(free) >= n:
+            return random.sample(free, n)
+        upper *= 10
 
+@lru_cache(maxsize=4096)
 def format_datetime(dt_str):
     """Format datetime string for display"""
     if not dt_str:
         return "N/A"
+    # Stored timestamps are "YYYY-MM-DDTHH:MM:SS", so slicing is enough
+    if isinstance(dt_str, str) and len(dt_str) >= 16 and dt_str[10] in "T ":
+        return f"{dt_str[:10]} {dt_str[11:16]}"
     try:
         dt = datetime.fromisoformat(dt_str)
         return dt.strftime("%Y-%m-%d %H:%M")
     except:
         return dt_str
 
-def format_address(street, city, state, zip_code, country):
-    """Format address components into a readable address"""
-    address_parts = []
-    if street:
-        address_parts.append(street)
-    if city:
-        address_parts.append(city)
-    if state:
-        address_parts.append(state)
-    if zip_code:
-        address_parts.append(zip_code)
-    if country:
-        address_parts.append(country)
-    
-    return ", ".join(filter(None, address_parts)) if address_parts else ""
+def fill_blank(col: pd.Series, placeholder: str) -> pd.Series:
+    """Replace missing or empty values in a text column with a placeholder"""
+    return col.where(col.fillna("").astype(str) != "", placeholder)
+
+# ---------- Database Connection ----------
+def get_conn() -> sqlite3.Connection:
+    """Shared read-write connection for the current DB_PATH; use under _db_lock()"""
+    return _open_conn(DB_PATH)
+
+def get_read_conn() -> sqlite3.Connection:
+    """Shared read-only connection for the current DB_PATH; use under _read_lock()"""
+    return _open_conn(DB_PATH, read_only=True)
+
+@st.cache_resource
+def _open_conn(path: str, read_only: bool = False) -> sqlite3.Connection:
+    """Open one connection per database file and mode, reused by every session and rerun"""
+    # With WAL, queries on the read-only connection don't wait for a write in progress
+    target = Path(path).absolute().as_uri() + "?mode=ro" if read_only else path
+    # Room in the statement cache for the many filter/sort/page variants of the lead query
+    conn = sqlite3.connect(target, timeout=30.0, check_same_thread=False, cached_statements=256, uri=read_only)
+    # Per-connection settings; journal_mode=WAL is persisted in the file by init_db
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA temp_store=memory;")
+    conn.execute("PRAGMA mmap_size=1073741824;")  # 1GB
+    conn.execute("PRAGMA cache_size=-131072;")  # 128MB
+    # Rows index by column name as well as position
+    conn.row_factory = sqlite3.Row
+    return conn
+
+@st.cache_resource
+def _db_lock():
+    """Serializes use of the shared read-write connection across sessions"""
+    return threading.RLock()
+
+@st.cache_resource
+def _read_lock():
+    """Serializes use of the shared read-only connection across sessions"""
+    return threading.RLock()
 
 # ---------- Database Initialization with Migration ----------
+# Stored in PRAGMA user_version once init_db has brought a file up to date;
+# bump it whenever the columns, indexes or search table below change
+SCHEMA_VERSION = 4
+# Columns added to leads after its first release, applied by init_db when missing
+LEAD_MIGRATIONS = [
+    ("place", "TEXT"),
+    ("street_address", "TEXT"),
+    ("city", "TEXT"),
+    ("state", "TEXT"),
+    ("zip_code", "TEXT"),
+    ("country", "TEXT"),
+    ("full_address", "TEXT"),
+    ("ref_number", "TEXT"),
+    ("created_at", "TEXT"),
+    ("updated_at", "TEXT"),
+    ("preferred_date", "TEXT"),
+    ("preferred_time", "TEXT"),
+]
+
+# Indexes backing the lead filters, sort orders and the schedule view
+LEAD_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_leads_ref ON leads(ref_number);",
+    "CREATE INDEX IF NOT EXISTS idx_leads_created ON leads(created_at);",
+    "CREATE INDEX IF NOT EXISTS idx_leads_value ON leads(value);",
+    "CREATE INDEX IF NOT EXISTS idx_leads_name ON leads(name);",
+    # Filter + default sort, so a filtered page is read in order without a temp sort
+    "CREATE INDEX IF NOT EXISTS idx_leads_status_created ON leads(status, created_at DESC);",
+    "CREATE INDEX IF NOT EXISTS idx_leads_source_created ON leads(source, created_at DESC);",
+    "CREATE INDEX IF NOT EXISTS idx_leads_preferred ON leads(preferred_date, preferred_time) "
+    "WHERE preferred_date IS NOT NULL OR preferred_time IS NOT NULL;",
+]
+LEAD_INDEX_NAMES = [re.search(r"EXISTS (\w+)", stmt).group(1) for stmt in LEAD_INDEXES]
+# Single-column indexes superseded by the (status|source, created_at) composites; init_db drops them
+RETIRED_INDEXES = ["idx_leads_status", "idx_leads_source"]
+# An import whose first chunk has at least this many rows, and more rows than the table
+# already holds, drops the secondary indexes and rebuilds them once after inserting
+BULK_IMPORT_ROWS = 10_000
+
+def _ensure_fts(conn):
+    """Create the full-text search index over the searchable columns, kept in sync by triggers"""
+    has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name='leads_fts'").fetchone()
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS leads_fts
+        USING fts5(name, email, place, owner, tags, notes, ref_number, full_address, content='leads', content_rowid='id')
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS leads_fts_ai AFTER INSERT ON leads BEGIN
+            INSERT INTO leads_fts(rowid, name, email, place, owner, tags, notes, ref_number, full_address)
+            VALUES (new.id, new.name, new.email, new.place, new.owner, new.tags, new.notes, new.ref_number, new.full_address);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS leads_fts_ad AFTER DELETE ON leads BEGIN
+            INSERT INTO leads_fts(leads_fts, rowid, name, email, place, owner, tags, notes, ref_number, full_address)
+            VALUES ('delete', old.id, old.name, old.email, old.place, old.owner, old.tags, old.notes, old.ref_number, old.full_address);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS leads_fts_au AFTER UPDATE ON leads BEGIN
+            INSERT INTO leads_fts(leads_fts, rowid, name, email, place, owner, tags, notes, ref_number, full_address)
+            VALUES ('delete', old.id, old.name, old.email, old.place, old.owner, old.tags, old.notes, old.ref_number, old.full_address);
+            INSERT INTO leads_fts(rowid, name, email, place, owner, tags, notes, ref_number, full_address)
+            VALUES (new.id, new.name, new.email, new.place, new.owner, new.tags, new.notes, new.ref_number, new.full_address);
+        END
+    """)
+    if not has_fts:
+        # Index rows that predate the search table
+        conn.execute("INSERT INTO leads_fts(leads_fts) VALUES ('rebuild')")
+
 def init_db():
     """Initialize database with proper error handling and persistence"""
     global DB_PATH
@@ -59,12 +225,17 @@ def init_db():
         # Ensure directory exists
         os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
         
-        with closing(sqlite3.connect(DB_PATH, timeout=30.0)) as conn:
+        with _db_lock(), get_conn() as conn:
+            # Nothing to do for a file already on the current schema
+            if conn.execute("PRAGMA user_version;").fetchone()[0] == SCHEMA_VERSION:
+                return
+            
+            # Larger pages for a new database file (no-op once it has been created)
+            conn.execute("PRAGMA page_size=8192;")
             # Enable WAL mode for better concurrency
             conn.execute("PRAGMA journal_mode=WAL;")
-            conn.execute("PRAGMA synchronous=NORMAL;")
-            conn.execute("PRAGMA temp_store=memory;")
-            conn.execute("PRAGMA mmap_size=268435456;")  # 256MB
+            # Schema changes, backfills and indexes commit together when the with block exits
+            conn.execute("BEGIN IMMEDIATE")
             
             cur = conn.cursor()
             cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='leads'")
@@ -96,10 +267,10 @@ def init_db():
                     );
                 """)
                 # Create index for better performance
-                conn.execute("CREATE INDEX IF NOT EXISTS idx_leads_ref ON leads(ref_number);")
-                conn.execute("CREATE INDEX IF NOT EXISTS idx_leads_status ON leads(status);")
-                conn.execute("CREATE INDEX IF NOT EXISTS idx_leads_created ON leads(created_at);")
-                conn.commit()
+                for stmt in LEAD_INDEXES:
+                    conn.execute(stmt)
+                _ensure_fts(conn)
+                conn.execute(f"PRAGMA user_version={SCHEMA_VERSION};")
                 return
 
             # Table exists, check columns
@@ -107,57 +278,36 @@ def init_db():
             cols = [c[1] for c in cur.fetchall()]
 
             # Add missing columns
-            if "place" not in cols:
-                conn.execute("ALTER TABLE leads ADD COLUMN place TEXT;")
-            if "street_address" not in cols:
-                conn.execute("ALTER TABLE leads ADD COLUMN street_address TEXT;")
-            if "city" not in cols:
-                conn.execute("ALTER TABLE leads ADD COLUMN city TEXT;")
-            if "state" not in cols:
-                conn.execute("ALTER TABLE leads ADD COLUMN state TEXT;")
-            if "zip_code" not in cols:
-                conn.execute("ALTER TABLE leads ADD COLUMN zip_code TEXT;")
-            if "country" not in cols:
-                conn.execute("ALTER TABLE leads ADD COLUMN country TEXT;")
-            if "full_address" not in cols:
-                conn.execute("ALTER TABLE leads ADD COLUMN full_address TEXT;")
+            for col, col_type in LEAD_MIGRATIONS:
+                if col not in cols:
+                    conn.execute(f"ALTER TABLE leads ADD COLUMN {col} {col_type};")
             
-            if "ref_number" not in cols:
-                conn.execute("ALTER TABLE leads ADD COLUMN ref_number TEXT;")
-                cur.execute("SELECT id FROM leads WHERE ref_number IS NULL OR ref_number=''")
-                for rid, in cur.fetchall():
-                    conn.execute("UPDATE leads SET ref_number=? WHERE id=?", (_generate_ref(), rid))
-            else:
-                # Update existing reference numbers to new format if they don't match
-                cur.execute("SELECT id, ref_number FROM leads")
-                for rid, ref_num in cur.fetchall():
-                    if not ref_num or not ref_num.startswith("GDC-"):
-                        conn.execute("UPDATE leads SET ref_number=? WHERE id=?", (_generate_ref(), rid))
+            # Fill missing reference numbers and move old ones to the new format in one batch
+            cur.execute("SELECT id FROM leads WHERE ref_number IS NULL OR substr(ref_number, 1, 4) != 'GDC-'")
+            ids = [rid for rid, in cur.fetchall()]
+            conn.executemany("UPDATE leads SET ref_number=? WHERE id=?", zip(_bulk_refs(len(ids), conn), ids))
             
+            # Seed timestamps on rows that predate them
+            now = _now()
             if "created_at" not in cols:
-                conn.execute("ALTER TABLE leads ADD COLUMN created_at TEXT;")
-                conn.execute("UPDATE leads SET created_at=? WHERE created_at IS NULL OR created_at=''", (_now(),))
+                conn.execute("UPDATE leads SET created_at=? WHERE created_at IS NULL OR created_at=''", (now,))
             if "updated_at" not in cols:
-                conn.execute("ALTER TABLE leads ADD COLUMN updated_at TEXT;")
-                conn.execute("UPDATE leads SET updated_at=? WHERE updated_at IS NULL OR updated_at=''", (_now(),))
-            if "preferred_date" not in cols:
-                conn.execute("ALTER TABLE leads ADD COLUMN preferred_date TEXT;")
-            if "preferred_time" not in cols:
-                conn.execute("ALTER TABLE leads ADD COLUMN preferred_time TEXT;")
+                conn.execute("UPDATE leads SET updated_at=? WHERE updated_at IS NULL OR updated_at=''", (now,))
             
             # Create indexes if they don't exist
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_leads_ref ON leads(ref_number);")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_leads_status ON leads(status);")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_leads_created ON leads(created_at);")
-            
-            conn.commit()
+            for stmt in LEAD_INDEXES:
+                conn.execute(stmt)
+            for name in RETIRED_INDEXES:
+                conn.execute(f"DROP INDEX IF EXISTS {name};")
+            _ensure_fts(conn)
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION};")
             
     except Exception as e:
         st.error(f"Database initialization error: {str(e)}")
         # Fallback: try to create database in current directory
         DB_PATH = "enhanced_leads.db"
         try:
-            with closing(sqlite3.connect(DB_PATH, timeout=30.0)) as conn:
+            with _db_lock(), get_conn() as conn:
                 conn.execute("""
                     CREATE TABLE IF NOT EXISTS leads (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -184,39 +334,37 @@ def init_db():
                         updated_at TEXT NOT NULL
                     );
                 """)
-                conn.commit()
+                _ensure_fts(conn)
         except Exception as e2:
             st.error(f"Fallback database creation failed: {str(e2)}")
             raise e2
 
+@st.cache_resource
+def _schema_ready() -> str:
+    """Run init_db once per process instead of on every rerun; returns the database path it settled on"""
+    init_db()
+    return DB_PATH
+
+@st.cache_data(ttl=900, show_spinner=False)
+def _optimize_db(path: str) -> None:
+    """Let SQLite refresh planner statistics it considers stale, at most every 15 minutes"""
+    with _db_lock():
+        get_conn().execute("PRAGMA optimize;")
+
 # ---------- CRUD ----------
 def add_lead(data: dict):
-    """Add lead with improved error handling and data validation"""
+    """Add lead with improved error handling and data validation; returns its reference, or None on failure"""
     try:
-        with closing(sqlite3.connect(DB_PATH, timeout=30.0)) as conn:
-            # Format the full address
-            full_address = format_address(
-                data.get("street_address"),
-                data.get("city"),
-                data.get("state"),
-                data.get("zip_code"),
-                data.get("country")
-            )
-            
-            # Ensure required fields have values
-            ref_number = data.get("ref_number") or _generate_ref()
+        with _db_lock(), get_conn() as conn:
             name = data.get("name", "").strip()
             
             if not name:
                 raise ValueError("Name is required")
+            # Drawn under the write lock from the refs still free today, so it cannot collide
+            ref_number = data.get("ref_number") or _bulk_refs(1, conn)[0]
             
-            conn.execute("""
-                INSERT INTO leads
-                (ref_number, name, email, phone, place, street_address, city, state, zip_code, 
-                 country, full_address, source, owner, status, value, tags, notes, 
-                 preferred_date, preferred_time, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
+            now = _now()
+            conn.execute(INSERT_LEAD_SQL, (
                 ref_number,
                 name,
                 data.get("email", ""),
@@ -227,7 +375,7 @@ def add_lead(data: dict):
                 data.get("state", ""),
                 data.get("zip_code", ""),
                 data.get("country", ""),
-                full_address,
+                None,  # full_address is built by INSERT_LEAD_SQL
                 data.get("source", ""),
                 data.get("owner", ""),
                 data.get("status", "New"),
@@ -236,88 +384,229 @@ def add_lead(data: dict):
                 data.get("notes", ""),
                 data.get("preferred_date", ""),
                 data.get("preferred_time", ""),
-                _now(),
-                _now(),
+                now,
+                now,
             ))
-            conn.commit()
-            return True
+        _clear_caches()
+        return ref_number
     except Exception as e:
         st.error(f"Error adding lead: {str(e)}")
-        return False
+        return None
 
 def update_lead(lead_id: int, updates: dict):
     if not updates:
         return
     
     try:
-        # If any address component is updated, recalculate full_address
-        address_fields = ["street_address", "city", "state", "zip_code", "country"]
-        if any(field in updates for field in address_fields):
-            # Get current address data
-            current_lead = get_lead_by_id(lead_id)
-            if current_lead:
-                street = updates.get("street_address", current_lead.get("street_address", ""))
-                city = updates.get("city", current_lead.get("city", ""))
-                state = updates.get("state", current_lead.get("state", ""))
-                zip_code = updates.get("zip_code", current_lead.get("zip_code", ""))
-                country = updates.get("country", current_lead.get("country", ""))
-                
-                updates["full_address"] = format_address(street, city, state, zip_code, country)
-        
         set_clause = ", ".join([f"{k}=?" for k in updates.keys()])
         params = list(updates.values()) + [_now(), lead_id]
-        with closing(sqlite3.connect(DB_PATH, timeout=30.0)) as conn:
+        with _db_lock(), get_conn() as conn:
             conn.execute(f"UPDATE leads SET {set_clause}, updated_at=? WHERE id=?", params)
-            conn.commit()
+            # Rebuild full_address from the stored parts when any of them changed
+            if any(field in updates for field in ADDRESS_FIELDS):
+                conn.execute(f"UPDATE leads SET full_address = {FULL_ADDRESS_SQL} WHERE id=?", (lead_id,))
+        _clear_caches()
     except Exception as e:
         st.error(f"Error updating lead: {str(e)}")
 
 def delete_lead(lead_id: int):
     try:
-        with closing(sqlite3.connect(DB_PATH, timeout=30.0)) as conn:
-            conn.execute("DELETE FROM leads WHERE id=?", (lead_id,))
-            conn.commit()
+        with _db_lock(), get_conn() as conn:
+            conn.execute(DELETE_LEAD_SQL, (lead_id,))
+        _clear_caches()
     except Exception as e:
         st.error(f"Error deleting lead: {str(e)}")
 
-def fetch_leads(filters: dict = None) -> pd.DataFrame:
+def import_leads(chunks) -> int:
+    """Insert prepared import rows (a DataFrame or an iterable of them) in a single transaction and return how many were written"""
+    chunks = iter([chunks] if isinstance(chunks, pd.DataFrame) else chunks)
+    first = next(chunks, None)
+    if first is None:
+        return 0
+    imported = 0
+    with _db_lock(), get_conn() as conn:
+        # Explicit BEGIN so dropped indexes come back on rollback
+        conn.execute("BEGIN IMMEDIATE")
+        rebuild = len(first) >= BULK_IMPORT_ROWS and len(first) > conn.execute("SELECT COUNT(*) FROM leads").fetchone()[0]
+        if rebuild:
+            for name in LEAD_INDEX_NAMES:
+                conn.execute(f"DROP INDEX IF EXISTS {name}")
+        for df in chain([first], chunks):
+            if "ref_number" not in df.columns:
+                # Checked on this connection so refs already inserted by earlier chunks are seen
+                df = df.assign(ref_number=_bulk_refs(len(df), conn))
+            rows = df.reindex(columns=INSERT_COLUMNS).astype(object)
+            rows = rows.where(rows.notna(), None)
+            conn.executemany(INSERT_LEAD_SQL, rows.itertuples(index=False, name=None))
+            imported += len(rows)
+        if rebuild:
+            for stmt in LEAD_INDEXES:
+                conn.execute(stmt)
+    _clear_caches()
+    return imported
+
+def prepare_import(df: pd.DataFrame) -> pd.DataFrame:
+    """Map an uploaded CSV chunk onto the leads columns and fill in defaults"""
+    # Rename alternative column names in one pass; the first alias present wins
+    renames = {}
+    for old_col, new_col in IMPORT_COLUMN_ALIASES.items():
+        if old_col in df.columns and new_col not in df.columns and new_col not in renames.values():
+            renames[old_col] = new_col
+    # Remove existing ID column if present; missing ref numbers are assigned by import_leads.
+    # Columns still missing are filled with NULL by the reindex in import_leads.
+    df = df.rename(columns=renames).drop(columns=["id"], errors="ignore")
+    
+    now = _now()
+    if "created_at" not in df.columns:
+        df["created_at"] = now
+    if "updated_at" not in df.columns:
+        df["updated_at"] = now
+    
+    # Ensure numeric value column
+    df["value"] = pd.to_numeric(df["value"], errors="coerce").fillna(0) if "value" in df.columns else 0.0
+    
+    # Set default status if not provided; other missing columns are stored as NULL
+    df["status"] = df["status"].fillna("New") if "status" in df.columns else "New"
+    return df
+
+def fetch_leads(filters: dict = None, columns: list = None, limit: int = None, offset: int = 0, after: tuple = None) -> pd.DataFrame:
     try:
-        filters = filters or {}
-        clauses, params = [], []
-        if filters.get("q"):
-            q = f"%{filters['q']}%"
-            clauses.append("(name LIKE ? OR email LIKE ? OR place LIKE ? OR owner LIKE ? OR tags LIKE ? OR notes LIKE ? OR ref_number LIKE ? OR full_address LIKE ?)")
-            params += [q, q, q, q, q, q, q, q]
-        if filters.get("status"):
-            clauses.append("status=?")
-            params.append(filters["status"])
-        if filters.get("owner"):
-            clauses.append("owner LIKE ?")
-            params.append(f"%{filters['owner']}%")
-        if filters.get("source"):
-            clauses.append("source=?")
-            params.append(filters["source"])
-        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
-        order = filters.get("order_by", "created_at DESC")
-        
-        with closing(sqlite3.connect(DB_PATH, timeout=30.0)) as conn:
-            query = f"SELECT * FROM leads {where} ORDER BY {order}"
-            df = pd.read_sql_query(query, conn, params=params)
-        return df
+        return _fetch_leads(tuple(sorted((filters or {}).items())), tuple(columns or ()), limit, offset, after)
     except Exception as e:
         st.error(f"Error fetching leads: {str(e)}")
         return pd.DataFrame()
 
+def _where_clause(filters: dict):
+    """Build the WHERE clause and its parameters for the lead filters"""
+    clauses, params = [], []
+    if filters.get("q"):
+        # Prefix-match every word of the query through the full-text index
+        terms = re.findall(r"\w+", filters["q"])
+        if terms:
+            clauses.append("id IN (SELECT rowid FROM leads_fts WHERE leads_fts MATCH ?)")
+            params.append(" ".join(f'"{t}"*' for t in terms))
+        else:
+            clauses.append(f"({SEARCH_TEXT_SQL}) LIKE ?")
+            params.append(f"%{filters['q']}%")
+    if filters.get("status"):
+        clauses.append("status=?")
+        params.append(filters["status"])
+    if filters.get("owner"):
+        clauses.append("owner LIKE ?")
+        params.append(f"%{filters['owner']}%")
+    if filters.get("source"):
+        clauses.append("source=?")
+        params.append(filters["source"])
+    if filters.get("has_schedule"):
+        clauses.append("(preferred_date IS NOT NULL OR preferred_time IS NOT NULL)")
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_leads(filters: tuple, columns: tuple = (), limit: int = None, offset: int = 0, after: tuple = None) -> pd.DataFrame:
+    """Cached query behind fetch_leads, keyed by its arguments; cleared on every write"""
+    filters = dict(filters)
+    where, params = _where_clause(filters)
+    # Only whitelisted orderings reach the SQL text
+    order = filters.get("order_by") if filters.get("order_by") in ALLOWED_ORDERS else "created_at DESC"
+    seek = KEYSET_ORDERS.get(order)
+    if seek:
+        # id breaks created_at ties, so seeking never skips or repeats a row
+        order += f", id {order.split()[1]}"
+        if after:
+            # Start right after the given (created_at, id) through the index instead of skipping rows
+            where += f" {'AND' if where else 'WHERE'} (created_at, id) {seek} (?, ?)"
+            params += list(after)
+            offset = 0
+    query = f"SELECT {', '.join(columns) or '*'} FROM leads {where} ORDER BY {order}"
+    if limit:
+        query += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+    
+    with _read_lock():
+        cur = get_read_conn().cursor()
+        cur.row_factory = None  # plain tuples build the frame fastest
+        rows = cur.execute(query, params).fetchall()
+    return pd.DataFrame.from_records(rows, columns=[d[0] for d in cur.description])
+
+def fetch_lead_totals(filters: dict = None) -> dict:
+    try:
+        return _fetch_lead_totals(tuple(sorted((filters or {}).items())))
+    except Exception as e:
+        st.error(f"Error fetching lead totals: {str(e)}")
+        return {"count": 0, "total_value": 0, "avg_value": 0}
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_lead_totals(filters: tuple) -> dict:
+    """Count, total and average value of all leads matching the filters"""
+    where, params = _where_clause(dict(filters))
+    with _read_lock():
+        count, total_value, avg_value = get_read_conn().execute(
+            f"SELECT COUNT(*), COALESCE(SUM(value), 0), COALESCE(AVG(value), 0) FROM leads {where}", params
+        ).fetchone()
+    return {"count": count, "total_value": total_value, "avg_value": avg_value}
+
+def fetch_analytics() -> dict:
+    try:
+        return _fetch_analytics()
+    except Exception as e:
+        st.error(f"Error fetching analytics: {str(e)}")
+        return {}
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_analytics() -> dict:
+    """Lead totals and per-status/source/city breakdowns, aggregated by SQLite"""
+    with _read_lock():
+        conn = get_read_conn()
+        total, total_value, avg_value, won = conn.execute("""
+            SELECT COUNT(*), COALESCE(SUM(value), 0), COALESCE(AVG(value), 0), COALESCE(SUM(status = 'Won'), 0)
+            FROM leads
+        """).fetchone()
+        by_status = _grouped_frame(
+            conn,
+            "SELECT status, COUNT(*) AS leads, SUM(value) AS value FROM leads "
+            "WHERE status IS NOT NULL GROUP BY status"
+        )
+        by_source = _grouped_frame(
+            conn,
+            "SELECT source, COUNT(*) AS leads FROM leads "
+            "WHERE source IS NOT NULL GROUP BY source ORDER BY leads DESC"
+        )
+        by_city = _grouped_frame(
+            conn,
+            "SELECT city, COUNT(*) AS leads FROM leads "
+            "WHERE city IS NOT NULL AND city != '' GROUP BY city ORDER BY leads DESC LIMIT 10"
+        )
+    return {
+        "total": total,
+        "total_value": total_value,
+        "avg_value": avg_value,
+        "won": won,
+        "by_status": by_status,
+        "by_source": by_source,
+        "by_city": by_city,
+    }
+
+def _grouped_frame(conn, query: str) -> pd.DataFrame:
+    """Small GROUP BY result as a DataFrame indexed by its first column"""
+    cur = conn.cursor()
+    cur.row_factory = None
+    rows = cur.execute(query).fetchall()
+    cols = [d[0] for d in cur.description]
+    return pd.DataFrame.from_records(rows, columns=cols, index=cols[0])
+
+def _clear_caches():
+    """Drop cached query results after a write"""
+    _fetch_leads.clear()
+    _fetch_lead_totals.clear()
+    _fetch_analytics.clear()
+    _fetch_database_stats.clear()
+
 def get_lead_by_id(lead_id: int) -> dict:
     try:
-        with closing(sqlite3.connect(DB_PATH, timeout=30.0)) as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT * FROM leads WHERE id=?", (lead_id,))
-            row = cur.fetchone()
-            if row:
-                cols = [desc[0] for desc in cur.description]
-                return dict(zip(cols, row))
-        return None
+        with _read_lock():
+            row = get_read_conn().execute("SELECT * FROM leads WHERE id=?", (lead_id,)).fetchone()
+        return dict(row) if row else None
     except Exception as e:
         st.error(f"Error fetching lead by ID: {str(e)}")
         return None
@@ -325,21 +614,7 @@ def get_lead_by_id(lead_id: int) -> dict:
 def get_database_stats():
     """Get database statistics for debugging"""
     try:
-        with closing(sqlite3.connect(DB_PATH, timeout=30.0)) as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT COUNT(*) FROM leads")
-            count = cur.fetchone()[0]
-            
-            cur.execute("SELECT created_at FROM leads ORDER BY created_at DESC LIMIT 1")
-            latest = cur.fetchone()
-            latest_date = latest[0] if latest else "No data"
-            
-            return {
-                "total_leads": count,
-                "latest_entry": latest_date,
-                "db_path": DB_PATH,
-                "db_exists": os.path.exists(DB_PATH)
-            }
+        return _fetch_database_stats(DB_PATH)
     except Exception as e:
         return {
             "error": str(e),
@@ -347,12 +622,33 @@ def get_database_stats():
             "db_exists": os.path.exists(DB_PATH)
         }
 
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_database_stats(path: str) -> dict:
+    """Lead count and newest created_at in one query; cleared on every write"""
+    with _read_lock():
+        count, latest = get_read_conn().execute("SELECT COUNT(*), MAX(created_at) FROM leads").fetchone()
+    return {
+        "total_leads": count,
+        "latest_entry": latest or "No data",
+        "db_path": path,
+        "db_exists": os.path.exists(path)
+    }
+
+# ---------- Export ----------
+@st.cache_data(show_spinner=False, max_entries=4)
+def export_csv(df: pd.DataFrame) -> bytes:
+    """Encode leads as CSV bytes in row chunks; cached until the data changes"""
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False, chunksize=10000)
+    return buf.getvalue()
+
 # ---------- Streamlit UI ----------
 st.set_page_config(page_title="Enhanced Lead CRM", layout="wide", page_icon="🏢")
 
 # Initialize database with error handling
 try:
-    init_db()
+    DB_PATH = _schema_ready()
+    _optimize_db(DB_PATH)
     # Show database status in sidebar
     db_stats = get_database_stats()
     if "error" not in db_stats:
@@ -414,6 +710,13 @@ st.markdown("""
 if "edit_id" not in st.session_state:
     st.session_state.edit_id = None
 
+# Leads tab paging: page_cursors holds the seek cursor each visited page started from
+def _next_page(cursor):
+    st.session_state.page_cursors.append(cursor)
+
+def _prev_page():
+    st.session_state.page_cursors.pop()
+
 # Sidebar - Add Lead
 with st.sidebar:
     st.header("➕ Add New Lead")
@@ -470,9 +773,7 @@ with st.sidebar:
             if not name.strip():
                 st.error("❌ Name is required.")
             else:
-                ref_number = _generate_ref()
                 lead_data = {
-                    "ref_number": ref_number,
                     "name": name,
                     "email": email,
                     "phone": phone,
@@ -492,7 +793,8 @@ with st.sidebar:
                     "preferred_time": str(preferred_time) if preferred_time else None
                 }
                 
-                if add_lead(lead_data):
+                ref_number = add_lead(lead_data)
+                if ref_number:
                     st.success(f"✅ Lead '{name}' added successfully!\n📋 Reference: {ref_number}")
                     st.balloons()
                     st.rerun()
@@ -521,15 +823,7 @@ with tab1:
     with col3:
         source_f = st.selectbox("Source Filter", ["All"] + SOURCES)
     with col4:
-        order_options = {
-            "Newest First": "created_at DESC",
-            "Oldest First": "created_at ASC", 
-            "Highest Value": "value DESC",
-            "Lowest Value": "value ASC",
-            "Name A-Z": "name ASC",
-            "Name Z-A": "name DESC"
-        }
-        order_by = st.selectbox("Sort By", list(order_options.keys()))
+        order_by = st.selectbox("Sort By", list(ORDER_OPTIONS.keys()))
     with col5:
         st.write("")  # spacing
 
@@ -539,23 +833,38 @@ with tab1:
         "status": status_f if status_f != "All" else None,
         "owner": owner_f,
         "source": source_f if source_f != "All" else None,
-        "order_by": order_options[order_by]
+        "order_by": ORDER_OPTIONS[order_by]
     }
     
-    df = fetch_leads(filters)
+    totals = fetch_lead_totals(filters)
     
     # Results summary
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("📊 Total Leads", len(df))
+        st.metric("📊 Total Leads", totals["count"])
     with col2:
-        if not df.empty:
-            total_value = df['value'].sum()
-            st.metric("💰 Total Value", f"${total_value:,.2f}")
+        if totals["count"]:
+            st.metric("💰 Total Value", f"${totals['total_value']:,.2f}")
     with col3:
-        if not df.empty:
-            avg_value = df['value'].mean()
-            st.metric("📈 Average Value", f"${avg_value:,.2f}")
+        if totals["count"]:
+            st.metric("📈 Average Value", f"${totals['avg_value']:,.2f}")
+
+    # Only the current page of leads is fetched and rendered; new filters start over at page 1
+    pages = max(1, -(-totals["count"] // PAGE_SIZE))
+    if st.session_state.get("page_filters") != filters or len(st.session_state.page_cursors) > pages:
+        st.session_state.page_filters = filters
+        st.session_state.page_cursors = [None]
+    page = len(st.session_state.page_cursors)
+    df = fetch_leads(filters, columns=LIST_COLUMNS, limit=PAGE_SIZE, offset=(page - 1) * PAGE_SIZE, after=st.session_state.page_cursors[-1])
+    if pages > 1:
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            st.button("◀ Previous", on_click=_prev_page, disabled=page == 1)
+        with col2:
+            st.caption(f"Page {page} of {pages}")
+        with col3:
+            last = (df["created_at"].iat[-1], int(df["id"].iat[-1])) if not df.empty else None
+            st.button("Next ▶", on_click=_next_page, args=(last,), disabled=page >= pages)
 
     if df.empty:
         st.info("🔍 No leads found matching your criteria.")
@@ -568,19 +877,39 @@ with tab1:
         else:
             st.error(f"Database error: {db_stats['error']}")
     else:
-        # Display leads
-        for _, row in df.iterrows():
+        # A single table widget for the page; selecting a row opens its card.
+        # The selection is positional, so the key follows the ids shown: a page turn,
+        # filter change, delete or re-sort starts a fresh selection instead of a stale index
+        selection = st.dataframe(
+            df.assign(created_at=df["created_at"].map(format_datetime)),
+            hide_index=True,
+            column_config={
+                "id": None,
+                "ref_number": "Ref",
+                "name": "Name",
+                "place": "Company/Place",
+                "status": "Status",
+                "value": st.column_config.NumberColumn("Value", format="$%.2f"),
+                "created_at": "Created",
+            },
+            on_select="rerun",
+            selection_mode="single-row",
+            key=f"leads_table_{hash(tuple(df['id']))}",
+        )
+        selected = [i for i in selection.selection.rows if i < len(df)]
+
+        row = get_lead_by_id(int(df["id"].iat[selected[0]])) if selected else None
+        if row:
             with st.container():
                 # Lead card header
                 col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
                 
                 with col1:
-                    status_class = f"status-{row['status'].lower().replace(' ', '-')}"
+                    status_class = STATUS_CLASS.get(row["status"], "")
+                    
                     preferred_info = ""
-                    if row['preferred_date'] or row['preferred_time']:
-                        pdate = row['preferred_date'] if row['preferred_date'] else "No date"
-                        ptime = row['preferred_time'] if row['preferred_time'] else "No time"
-                        preferred_info = f"📅 {pdate} ⏰ {ptime}"
+                    if row["preferred_date"] or row["preferred_time"]:
+                        preferred_info = f"📅 {row['preferred_date'] or 'No date'} ⏰ {row['preferred_time'] or 'No time'}"
                     
                     st.markdown(f"""
                     **🧑‍💼 {row['name']}** (📋 {row['ref_number']})  
@@ -591,7 +920,7 @@ with tab1:
                     """, unsafe_allow_html=True)
                     
                     # Display address if available
-                    if row['full_address']:
+                    if row["full_address"]:
                         st.markdown(f"""
                         <div class="address-display">
                             📍 <strong>Address:</strong> {row['full_address']}
@@ -599,8 +928,8 @@ with tab1:
                         """, unsafe_allow_html=True)
                 
                 with col2:
-                    st.markdown(f"**💰 ${row['value']:,.2f}**")
-                    if row['owner']:
+                    st.markdown(f"**💰 ${row['value'] or 0:,.2f}**")
+                    if row["owner"]:
                         st.caption(f"👤 {row['owner']}")
                 
                 with col3:
@@ -615,11 +944,11 @@ with tab1:
                         st.rerun()
 
                 # Show additional info if available
-                if row['tags'] or row['notes']:
+                if row["tags"] or row["notes"]:
                     with st.expander("📝 Additional Information"):
-                        if row['tags']:
+                        if row["tags"]:
                             st.write(f"🏷️ **Tags:** {row['tags']}")
-                        if row['notes']:
+                        if row["notes"]:
                             st.write(f"📝 **Notes:** {row['notes']}")
 
                 # Edit form
@@ -639,7 +968,7 @@ with tab1:
                             new_source = st.selectbox("Source", SOURCES, index=SOURCES.index(row["source"]) if row["source"] in SOURCES else 0)
                             new_owner = st.text_input("Owner", value=row["owner"] or "")
                             new_status = st.selectbox("Status", STATUSES, index=STATUSES.index(row["status"]))
-                            new_value = st.number_input("Deal Value", min_value=0.0, step=100.0, value=float(row["value"]))
+                            new_value = st.number_input("Deal Value", min_value=0.0, step=100.0, value=float(row["value"] or 0))
                         
                         # Address fields
                         st.subheader("Address Information")
@@ -710,48 +1039,42 @@ with tab1:
 with tab2:
     st.subheader("📊 Lead Analytics")
     
-    df_all = fetch_leads()
+    stats = fetch_analytics()
     
-    if df_all.empty:
+    if not stats.get("total"):
         st.info("📊 No data available for analytics.")
     else:
         # Summary metrics
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("Total Leads", len(df_all))
+            st.metric("Total Leads", stats["total"])
         with col2:
-            st.metric("Total Value", f"${df_all['value'].sum():,.2f}")
+            st.metric("Total Value", f"${stats['total_value']:,.2f}")
         with col3:
-            won_leads = len(df_all[df_all['status'] == 'Won'])
-            win_rate = (won_leads / len(df_all)) * 100 if len(df_all) > 0 else 0
+            win_rate = (stats["won"] / stats["total"]) * 100
             st.metric("Win Rate", f"{win_rate:.1f}%")
         with col4:
-            avg_value = df_all['value'].mean()
-            st.metric("Avg Deal Value", f"${avg_value:,.2f}")
+            st.metric("Avg Deal Value", f"${stats['avg_value']:,.2f}")
 
         # Charts
         col1, col2 = st.columns(2)
         with col1:
             st.subheader("Leads by Status")
-            status_counts = df_all["status"].value_counts()
-            st.bar_chart(status_counts)
+            st.bar_chart(stats["by_status"]["leads"])
 
         with col2:
             st.subheader("Value by Status")
-            value_by_status = df_all.groupby("status")["value"].sum()
-            st.bar_chart(value_by_status)
+            st.bar_chart(stats["by_status"]["value"])
 
         col3, col4 = st.columns(2)
         with col3:
             st.subheader("Leads by Source")
-            source_counts = df_all["source"].value_counts()
-            st.bar_chart(source_counts)
+            st.bar_chart(stats["by_source"]["leads"])
 
         with col4:
             st.subheader("Leads by Location")
-            if df_all['city'].notna().any():
-                city_counts = df_all[df_all['city'].notna()]["city"].value_counts().head(10)
-                st.bar_chart(city_counts)
+            if not stats["by_city"].empty:
+                st.bar_chart(stats["by_city"]["leads"])
             else:
                 st.info("No location data available")
 
@@ -759,43 +1082,36 @@ with tab2:
 with tab3:
     st.subheader("📅 Scheduled Contacts")
     
-    # Filter for leads with scheduling info
-    df_scheduled = fetch_leads()
-    df_scheduled = df_scheduled[
-        (df_scheduled['preferred_date'].notna()) | 
-        (df_scheduled['preferred_time'].notna())
-    ]
+    # Leads with scheduling info, earliest preferred date first (undated last)
+    df_scheduled = fetch_leads(
+        {"has_schedule": True, "order_by": SCHEDULE_ORDER},
+        columns=SCHEDULE_COLUMNS
+    )
     
     if df_scheduled.empty:
         st.info("📅 No scheduled contacts found.")
     else:
-        # Sort by preferred date (compatible with older pandas versions)
-        try:
-            df_scheduled = df_scheduled.sort_values('preferred_date', na_position='last')
-        except TypeError:
-            # Fallback for older pandas versions
-            df_scheduled = df_scheduled.sort_values('preferred_date')
+        df_scheduled["pdate"] = fill_blank(df_scheduled["preferred_date"], "No date set")
+        df_scheduled["ptime"] = fill_blank(df_scheduled["preferred_time"], "No time set")
         
-        for _, row in df_scheduled.iterrows():
+        for row in df_scheduled.itertuples(index=False):
             with st.container():
                 col1, col2, col3 = st.columns([2, 1, 1])
                 
                 with col1:
-                    pdate = row['preferred_date'] if row['preferred_date'] else "No date set"
-                    ptime = row['preferred_time'] if row['preferred_time'] else "No time set"
-                    st.write(f"**{row['name']}** ({row['ref_number']})")
-                    st.write(f"📧 {row['email']} | 📞 {row['phone']}")
-                    if row['full_address']:
-                        st.write(f"📍 {row['full_address']}")
+                    st.write(f"**{row.name}** ({row.ref_number})")
+                    st.write(f"📧 {row.email} | 📞 {row.phone}")
+                    if row.full_address:
+                        st.write(f"📍 {row.full_address}")
                 
                 with col2:
-                    st.write(f"📅 **{pdate}**")
-                    st.write(f"⏰ **{ptime}**")
+                    st.write(f"📅 **{row.pdate}**")
+                    st.write(f"⏰ **{row.ptime}**")
                 
                 with col3:
-                    st.write(f"Status: **{row['status']}**")
-                    if row['owner']:
-                        st.write(f"Owner: {row['owner']}")
+                    st.write(f"Status: **{row.status}**")
+                    if row.owner:
+                        st.write(f"Owner: {row.owner}")
                 
                 st.divider()
 
@@ -807,10 +1123,9 @@ with tab4:
         st.subheader("⬇️ Export Data")
         df_all = fetch_leads()
         if not df_all.empty:
-            csv_data = df_all.to_csv(index=False)
             st.download_button(
                 "📁 Download All Leads (CSV)",
-                csv_data,
+                export_csv(df_all),
                 "enhanced_leads_with_address.csv",
                 "text/csv",
                 use_container_width=True
@@ -825,79 +1140,26 @@ with tab4:
         
         if uploaded_file is not None:
             try:
-                new_df = pd.read_csv(uploaded_file)
+                # Read every column as text: no per-column type inference, and phone/ZIP/ref
+                # values keep their leading zeros. prepare_import converts "value" to numbers.
+                new_df = pd.read_csv(uploaded_file, dtype=str, nrows=5)
                 
                 st.write("Preview of uploaded data:")
-                st.dataframe(new_df.head())
+                st.dataframe(new_df)
                 
                 if st.button("🚀 Import Data", key="import_data_btn", use_container_width=True):
-                    # Handle column mapping
-                    if "company" in new_df.columns and "place" not in new_df.columns:
-                        new_df = new_df.rename(columns={"company": "place"})
-                    
-                    # Map address columns if they exist under different names
-                    column_mapping = {
-                        "address": "street_address",
-                        "street": "street_address",
-                        "postal_code": "zip_code",
-                        "postcode": "zip_code",
-                        "zip": "zip_code"
-                    }
-                    
-                    for old_col, new_col in column_mapping.items():
-                        if old_col in new_df.columns and new_col not in new_df.columns:
-                            new_df = new_df.rename(columns={old_col: new_col})
-                    
-                    # Remove existing ID column if present
-                    if "id" in new_df.columns:
-                        new_df = new_df.drop(columns=["id"])
-                    
-                    # Add required columns
-                    if "ref_number" not in new_df.columns:
-                        new_df["ref_number"] = [_generate_ref() for _ in range(len(new_df))]
-                    
-                    now = _now()
-                    if "created_at" not in new_df.columns:
-                        new_df["created_at"] = now
-                    if "updated_at" not in new_df.columns:
-                        new_df["updated_at"] = now
-                    
-                    # Ensure numeric value column
-                    new_df["value"] = pd.to_numeric(new_df.get("value", 0), errors="coerce").fillna(0)
-                    
-                    # Create full_address from components if not present
-                    if "full_address" not in new_df.columns:
-                        new_df["full_address"] = ""
-                        for idx, row in new_df.iterrows():
-                            full_addr = format_address(
-                                row.get("street_address"),
-                                row.get("city"),
-                                row.get("state"),
-                                row.get("zip_code"),
-                                row.get("country")
-                            )
-                            new_df.at[idx, "full_address"] = full_addr
-                    
-                    # Ensure all required columns exist with default values
-                    required_columns = [
-                        "street_address", "city", "state", "zip_code", "country",
-                        "place", "email", "phone", "source", "owner", "status",
-                        "tags", "notes", "preferred_date", "preferred_time"
-                    ]
-                    
-                    for col in required_columns:
-                        if col not in new_df.columns:
-                            new_df[col] = None
-                    
-                    # Set default status if not provided
-                    new_df["status"] = new_df["status"].fillna("New")
+                    # Parse and map the file in chunks; every chunk goes into the same transaction
+                    uploaded_file.seek(0)
+                    chunks = pd.read_csv(
+                        uploaded_file, dtype=str, chunksize=10_000,
+                        usecols=lambda c: c in IMPORT_CSV_COLUMNS
+                    )
                     
                     # Import to database
                     try:
-                        with closing(sqlite3.connect(DB_PATH, timeout=30.0)) as conn:
-                            new_df.to_sql("leads", conn, if_exists="append", index=False)
+                        imported = import_leads(prepare_import(chunk) for chunk in chunks)
                         
-                        st.success(f"✅ Successfully imported {len(new_df)} leads!")
+                        st.success(f"✅ Successfully imported {imported} leads!")
                         st.balloons()
                         st.rerun()
                     except Exception as import_error:
@@ -917,31 +1179,34 @@ with st.expander("🎯 Generate Sample Data for Testing"):
     with col2:
         if st.button("🎲 Generate Sample Data", use_container_width=True):
             try:
-                sample_data = [
-                    {
-                        "name": f"Sample Lead {i+1}",
-                        "email": f"lead{i+1}@example.com",
-                        "phone": f"+1-555-{1000+i:04d}",
-                        "place": f"Sample Company {i+1}",
-                        "street_address": f"{100+i*10} Sample Street",
-                        "city": ["New York", "Los Angeles", "Chicago", "Houston", "Phoenix"][i % 5],
-                        "state": ["NY", "CA", "IL", "TX", "AZ"][i % 5],
-                        "zip_code": f"{10001+i:05d}",
-                        "country": "USA",
-                        "source": SOURCES[i % len(SOURCES)],
-                        "owner": f"Owner {i % 3 + 1}",
-                        "status": STATUSES[i % len(STATUSES)],
-                        "value": (i + 1) * 1000,
-                        "tags": f"sample, test, lead{i+1}",
-                        "notes": f"This is a sample lead #{i+1} for testing purposes."
-                    }
-                    for i in range(num_samples)
-                ]
+                # Every field is built column-wise from the row numbers
+                i = pd.Series(range(num_samples))
+                num = (i + 1).astype(str)
+                
+                def cycle(values):
+                    return pd.Series(values).take(i % len(values)).to_numpy()
+                
+                sample_data = pd.DataFrame({
+                    "name": "Sample Lead " + num,
+                    "email": "lead" + num + "@example.com",
+                    "phone": "+1-555-" + (1000 + i).astype(str).str.zfill(4),
+                    "place": "Sample Company " + num,
+                    "street_address": (100 + i * 10).astype(str) + " Sample Street",
+                    "city": cycle(SAMPLE_CITIES),
+                    "state": cycle(SAMPLE_STATES),
+                    "zip_code": (10001 + i).astype(str).str.zfill(5),
+                    "country": "USA",
+                    "source": cycle(SOURCES),
+                    "owner": "Owner " + (i % 3 + 1).astype(str),
+                    "status": cycle(STATUSES),
+                    "value": (i + 1) * 1000.0,
+                    "tags": "sample, test, lead" + num,
+                    "notes": "This is a sample lead #" + num + " for testing purposes."
+                })
+                sample_data["created_at"] = sample_data["updated_at"] = _now()
                 
-                success_count = 0
-                for data in sample_data:
-                    if add_lead(data):
-                        success_count += 1
+                # One transaction for the whole batch
+                success_count = import_leads(sample_data)
                 
                 st.success(f"✅ Generated {success_count} sample leads successfully!")
                 st.rerun()
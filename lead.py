@@ -1,22 +1,58 @@
+import io
+import re
 import sqlite3
-from contextlib import closing
-from datetime import datetime
+from datetime import date, datetime, time as dtime
 import pandas as pd
 import streamlit as st
-import uuid
+import threading
+import time
 
 DB_PATH = "leads.db"
 
 STATUSES = ["New", "Contacted", "Qualified", "In Progress", "Won", "Lost", "Closed"]
 SOURCES = ["Website", "Referral", "Email", "Phone", "Social", "Event", "Other"]
+STATUS_IDX = {s: i for i, s in enumerate(STATUSES)}
+SOURCE_IDX = {s: i for i, s in enumerate(SOURCES)}
+# The only ORDER BY clauses fetch_leads will interpolate; each is backed by an index
+ORDER_OPTIONS = ["created_at DESC", "value DESC", "value ASC", "name ASC", "name DESC"]
 
 # ---------- Database ----------
+# Ref numbers are generated by SQLite: millisecond time prefix + 64 random bits, appended in
+# B-tree order; a bulk insert puts thousands of rows in one millisecond, so the random part must be wide
+_REF_SQL = "printf('%011X', CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)) || upper(hex(randomblob(8)))"
+# Columns add_lead and import_leads bind after ref_number; both INSERT statements are built once from it
+LEAD_COLUMNS = ["name", "email", "phone", "place", "source", "owner", "status", "value", "tags", "notes",
+                "preferred_datetime", "created_at", "created_time", "updated_at"]
+_INSERT_INTO = f"INTO leads (ref_number, {', '.join(LEAD_COLUMNS)}) VALUES"
+_PARAMS = ", ".join("?" * len(LEAD_COLUMNS))
+ADD_LEAD_SQL = f"INSERT {_INSERT_INTO} ({_REF_SQL}, {_PARAMS})"
+# Imported rows that carry a ref skip it if it already exists; rows without one go through
+# ADD_LEAD_SQL, so a generated-ref collision raises instead of passing as a duplicate
+IMPORT_LEADS_SQL = f"INSERT {_INSERT_INTO} (?, {_PARAMS}) ON CONFLICT(ref_number) DO NOTHING"
+
+@st.cache_resource
+def get_conn():
+    # One connection shared by every session and rerun; access is serialized by _db_lock()
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    # synchronous/cache settings are per-connection; journal_mode=WAL persists in the file
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA cache_size=-65536")
+    return conn
+
+@st.cache_resource
+def _db_lock():
+    return threading.RLock()
+
 def init_db():
-    with closing(sqlite3.connect(DB_PATH)) as conn:
-        conn.execute("""
+    with _db_lock(), get_conn() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"""
             CREATE TABLE IF NOT EXISTS leads (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ref_number TEXT UNIQUE NOT NULL,
+                ref_number TEXT UNIQUE NOT NULL DEFAULT ({_REF_SQL}),
                 name TEXT NOT NULL,
                 email TEXT,
                 phone TEXT,
@@ -33,24 +69,59 @@ def init_db():
                 updated_at TEXT NOT NULL
             );
         """)
-        conn.commit()
+        # Indexes backing the fetch_leads filters and sort orders
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_leads_source ON leads(source)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_leads_created ON leads(created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_leads_value ON leads(value)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_leads_name ON leads(name)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_leads_status_created ON leads(status, created_at DESC)")
+        # owner is only LIKE-matched and status is covered by the composite's prefix
+        conn.execute("DROP INDEX IF EXISTS idx_leads_owner")
+        conn.execute("DROP INDEX IF EXISTS idx_leads_status")
 
-def _now():
-    return datetime.utcnow().isoformat(timespec="seconds")
+        # Full-text index for the search box, kept in sync with leads by triggers
+        has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name='leads_fts'").fetchone()
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS leads_fts
+            USING fts5(name, email, place, owner, tags, notes, content='leads', content_rowid='id')
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS leads_fts_ai AFTER INSERT ON leads BEGIN
+                INSERT INTO leads_fts(rowid, name, email, place, owner, tags, notes)
+                VALUES (new.id, new.name, new.email, new.place, new.owner, new.tags, new.notes);
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS leads_fts_ad AFTER DELETE ON leads BEGIN
+                INSERT INTO leads_fts(leads_fts, rowid, name, email, place, owner, tags, notes)
+                VALUES ('delete', old.id, old.name, old.email, old.place, old.owner, old.tags, old.notes);
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS leads_fts_au AFTER UPDATE ON leads BEGIN
+                INSERT INTO leads_fts(leads_fts, rowid, name, email, place, owner, tags, notes)
+                VALUES ('delete', old.id, old.name, old.email, old.place, old.owner, old.tags, old.notes);
+                INSERT INTO leads_fts(rowid, name, email, place, owner, tags, notes)
+                VALUES (new.id, new.name, new.email, new.place, new.owner, new.tags, new.notes);
+            END
+        """)
+        if not has_fts:
+            # Index rows that predate the FTS table
+            conn.execute("INSERT INTO leads_fts(leads_fts) VALUES ('rebuild')")
 
-def _time():
-    return datetime.utcnow().strftime("%H:%M:%S")
+@st.cache_resource
+def _schema_ready():
+    # Run the CREATE/DROP statements once per process instead of on every rerun
+    init_db()
 
-def _ref():
-    return str(uuid.uuid4())[:8].upper()
+def _now():
+    # UTC "YYYY-MM-DDTHH:MM:SS"; the created_time column is its [11:] slice
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())
 
 def add_lead(data: dict):
-    with closing(sqlite3.connect(DB_PATH)) as conn:
-        conn.execute("""
-            INSERT INTO leads (ref_number, name, email, phone, place, source, owner, status, value, tags, notes, preferred_datetime, created_at, created_time, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            _ref(),
+    now = _now()
+    with _db_lock(), get_conn() as conn:
+        conn.execute(ADD_LEAD_SQL, (
             data.get("name"),
             data.get("email"),
             data.get("phone"),
@@ -62,33 +133,52 @@ def add_lead(data: dict):
             data.get("tags"),
             data.get("notes"),
             data.get("preferred_datetime"),
-            _now(),
-            _time(),
-            _now(),
+            now,
+            now[11:],
+            now,
         ))
-        conn.commit()
 
 def update_lead(lead_id: int, updates: dict):
     if not updates:
         return
     set_clause = ", ".join([f"{k}=?" for k in updates.keys()])
     params = list(updates.values()) + [_now(), lead_id]
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with _db_lock(), get_conn() as conn:
         conn.execute(f"UPDATE leads SET {set_clause}, updated_at=? WHERE id=?", params)
-        conn.commit()
+
+def get_lead(lead_id: int):
+    # One raw sqlite3.Row (None if gone) for the edit form; no DataFrame needed
+    with _db_lock():
+        return get_conn().execute("SELECT * FROM leads WHERE id=?", (lead_id,)).fetchone()
 
 def delete_lead(lead_id: int):
-    with closing(sqlite3.connect(DB_PATH)) as conn:
+    with _db_lock(), get_conn() as conn:
         conn.execute("DELETE FROM leads WHERE id=?", (lead_id,))
-        conn.commit()
+
+def _db_version() -> tuple:
+    # total_changes moves on our own writes; data_version moves when another
+    # process (or the sqlite3 CLI) commits, so together they key the caches
+    with _db_lock():
+        conn = get_conn()
+        return conn.total_changes, conn.execute("PRAGMA data_version").fetchone()[0]
 
 def fetch_leads(filters: dict = None) -> pd.DataFrame:
-    filters = filters or {}
+    return _fetch_leads(tuple(sorted((filters or {}).items())), _db_version())
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _fetch_leads(filters: tuple, version: tuple) -> pd.DataFrame:
+    filters = dict(filters)
     clauses, params = [], []
     if filters.get("q"):
-        q = f"%{filters['q']}%"
-        clauses.append("(name LIKE ? OR email LIKE ? OR place LIKE ? OR owner LIKE ? OR tags LIKE ? OR notes LIKE ?)")
-        params += [q, q, q, q, q, q]
+        # Prefix-match every word of the query; fall back to LIKE for input with no words
+        terms = re.findall(r"\w+", filters["q"])
+        if terms:
+            clauses.append("id IN (SELECT rowid FROM leads_fts WHERE leads_fts MATCH ?)")
+            params.append(" ".join(f'"{t}"*' for t in terms))
+        else:
+            q = f"%{filters['q']}%"
+            clauses.append("(name LIKE ? OR email LIKE ? OR place LIKE ? OR owner LIKE ? OR tags LIKE ? OR notes LIKE ?)")
+            params += [q, q, q, q, q, q]
     if filters.get("status"):
         clauses.append("status=?")
         params.append(filters["status"])
@@ -100,14 +190,110 @@ def fetch_leads(filters: dict = None) -> pd.DataFrame:
         params.append(filters["source"])
 
     where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
-    order = filters.get("order_by") or "created_at DESC"
-    with closing(sqlite3.connect(DB_PATH)) as conn:
-        df = pd.read_sql_query(f"SELECT * FROM leads {where} ORDER BY {order}", conn, params=params)
-    return df
+    order = filters.get("order_by") if filters.get("order_by") in ORDER_OPTIONS else ORDER_OPTIONS[0]
+    with _db_lock(), get_conn() as conn:
+        # Timestamps stay as the stored TEXT so exports write them back unchanged
+        return pd.read_sql_query(f"SELECT * FROM leads {where} ORDER BY {order}", conn, params=params)
+
+def analytics_summary() -> pd.DataFrame:
+    return _analytics_summary(_db_version())
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def _analytics_summary(version: tuple) -> pd.DataFrame:
+    # Aggregate inside SQLite so only one row per status crosses into pandas
+    with _db_lock(), get_conn() as conn:
+        return pd.read_sql_query(
+            "SELECT status, COUNT(*) AS leads, COALESCE(SUM(value), 0) AS value FROM leads "
+            "WHERE status IS NOT NULL GROUP BY status ORDER BY leads DESC",
+            conn, index_col="status",
+        )
+
+def _bindable(v):
+    # read_excel yields Timestamp/date/time cells, which sqlite3 cannot bind; store them as ISO text
+    if isinstance(v, (datetime, dtime)):
+        return v.isoformat(timespec="seconds")
+    if isinstance(v, date):
+        return v.isoformat()
+    return v
+
+def import_leads(df: pd.DataFrame) -> tuple:
+    # Returns (rows added, rows rejected for having no name)
+    if "name" in df.columns:
+        has_name = df["name"].notna() & df["name"].astype(str).str.strip().ne("")
+    else:
+        has_name = pd.Series(False, index=df.index)
+    nameless = int((~has_name).sum())
+    df = df[has_name]
+    n = len(df)
+    now = _now()
+
+    def col(name, default=None):
+        if name not in df.columns:
+            return [default] * n
+        values = df[name].astype(object)
+        values = values.where(values.notna(), default).tolist()
+        # Only datetime and mixed object columns can hold values that need converting
+        if df[name].dtype.kind in "MO":
+            values = [_bindable(v) for v in values]
+        return values
+
+    if "status" in df.columns:
+        status = df["status"].where(df["status"].isin(STATUSES), "New").tolist()
+    else:
+        status = ["New"] * n
+    if "value" in df.columns:
+        value = pd.to_numeric(df["value"], errors="coerce").fillna(0.0).tolist()
+    else:
+        value = [0.0] * n
+
+    # Columns are plain lists zipped into row tuples, split on whether the file supplied a ref
+    rows = zip(
+        col("ref_number"),
+        col("name"),
+        col("email"),
+        col("phone"),
+        col("place"),
+        col("source"),
+        col("owner"),
+        status,
+        value,
+        col("tags"),
+        col("notes"),
+        col("preferred_datetime"),
+        col("created_at", now),
+        col("created_time", now[11:]),
+        [now] * n,
+    )
+    supplied, generated = [], []
+    for r in rows:
+        if r[0] in (None, ""):
+            generated.append(r[1:])
+        else:
+            supplied.append(r)
+    with _db_lock(), get_conn() as conn:
+        added = conn.executemany(IMPORT_LEADS_SQL, supplied).rowcount
+        added += conn.executemany(ADD_LEAD_SQL, generated).rowcount
+    return added, nameless
+
+# ---------- Export ----------
+@st.cache_data(show_spinner=False, max_entries=4)
+def export_csv(df: pd.DataFrame) -> bytes:
+    # Encode straight into a byte buffer in row chunks; cached like export_xlsx
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False, chunksize=16384)
+    return buf.getvalue()
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def export_xlsx(df: pd.DataFrame) -> bytes:
+    # Build the workbook in memory; cached so reruns don't rewrite it until the data changes
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf) as writer:
+        df.to_excel(writer, index=False)
+    return buf.getvalue()
 
 # ---------- Streamlit UI ----------
 st.set_page_config(page_title="Lead CRM", layout="wide")
-init_db()
+_schema_ready()
 
 st.title("🗂️ Lead Management CRM (Enhanced)")
 
@@ -157,84 +343,96 @@ with tab1:
     with col1: status_f = st.selectbox("Status", [""] + STATUSES)
     with col2: owner_f = st.text_input("Owner filter")
     with col3: source_f = st.selectbox("Source", [""] + SOURCES)
-    with col4: order_by = st.selectbox("Order", ["created_at DESC","value DESC","value ASC","name ASC","name DESC"])
+    with col4: order_by = st.selectbox("Order", ORDER_OPTIONS)
 
-    df = fetch_leads({"q": q, "status": status_f or None, "owner": owner_f, "source": source_f or None, "order_by": order_by})
+    filters = {"q": q, "status": status_f or None, "owner": owner_f, "source": source_f or None, "order_by": order_by}
+    df = fetch_leads(filters)
     st.write(f"{len(df)} lead(s) found")
 
     if df.empty:
         st.info("No leads yet.")
     else:
-        if "edit_id" not in st.session_state:
-            st.session_state.edit_id = None
+        # A single table widget for the whole result set; selecting a row opens its editor.
+        # The selection is positional; keying on the filters and the DB version resets
+        # it after a search, filter change, save or delete instead of reusing a stale index
+        selection = st.dataframe(
+            df[["ref_number", "name", "email", "place", "status", "value", "preferred_datetime", "created_time"]],
+            hide_index=True,
+            on_select="rerun",
+            selection_mode="single-row",
+            key=f"leads_table_{hash((tuple(sorted(filters.items())), _db_version()))}",
+        )
+        selected = [i for i in selection.selection.rows if i < len(df)]
 
-        for _, row in df.iterrows():
-            col1, col2, col3, col4, col5 = st.columns([3, 1, 1, 1, 1])
+        row = get_lead(int(df["id"].iat[selected[0]])) if selected else None
+        if row:
+            st.markdown("---")
+            col1, col2 = st.columns([4, 1])
             with col1:
-                st.write(f"**{row['name']}** (Ref: {row['ref_number']})  \n{row['email']} | {row['place']} | {row['status']} | Call: {row['preferred_datetime']}")
+                st.write(f"**{row['name']}** (Ref: {row['ref_number']})")
             with col2:
-                st.write(f"💰 {row['value']}")
-            with col3:
-                st.write(f"🕒 {row['created_time']}")
-            with col4:
-                if st.button("✏️ Edit", key=f"edit{row['id']}"):
-                    st.session_state.edit_id = row["id"]
-            with col5:
                 if st.button("🗑️ Delete", key=f"del{row['id']}"):
                     delete_lead(int(row["id"]))
                     st.success(f"Deleted lead: {row['name']}")
                     st.rerun()
 
-            if st.session_state.edit_id == row["id"]:
-                st.markdown("---")
-                with st.form(f"edit_form_{row['id']}"):
-                    new_name = st.text_input("Name", value=row["name"])
-                    new_email = st.text_input("Email", value=row["email"] or "")
-                    new_phone = st.text_input("Phone", value=row["phone"] or "")
-                    new_place = st.text_input("Place", value=row["place"] or "")
-                    new_source = st.selectbox("Source", SOURCES, index=SOURCES.index(row["source"]) if row["source"] in SOURCES else 0)
-                    new_owner = st.text_input("Owner", value=row["owner"] or "")
-                    new_status = st.selectbox("Status", STATUSES, index=STATUSES.index(row["status"]))
-                    new_value = st.number_input("Deal Value", min_value=0.0, step=100.0, value=float(row["value"]))
-                    new_preferred_datetime = st.datetime_input("Preferred Date & Time", value=pd.to_datetime(row["preferred_datetime"]) if row["preferred_datetime"] else datetime.utcnow())
-                    new_tags = st.text_input("Tags", value=row["tags"] or "")
-                    new_notes = st.text_area("Notes", value=row["notes"] or "")
-                    save_changes = st.form_submit_button("💾 Save Changes")
-                    if save_changes:
-                        update_lead(int(row["id"]), {
-                            "name": new_name,
-                            "email": new_email,
-                            "phone": new_phone,
-                            "place": new_place,
-                            "source": new_source,
-                            "owner": new_owner,
-                            "status": new_status,
-                            "value": new_value,
-                            "preferred_datetime": new_preferred_datetime.isoformat() if new_preferred_datetime else None,
-                            "tags": new_tags,
-                            "notes": new_notes
-                        })
-                        st.success(f"Updated lead: {new_name}")
-                        st.session_state.edit_id = None
-                        st.rerun()
+            with st.form(f"edit_form_{row['id']}"):
+                new_name = st.text_input("Name", value=row["name"])
+                new_email = st.text_input("Email", value=row["email"] or "")
+                new_phone = st.text_input("Phone", value=row["phone"] or "")
+                new_place = st.text_input("Place", value=row["place"] or "")
+                new_source = st.selectbox("Source", SOURCES, index=SOURCE_IDX.get(row["source"], 0))
+                new_owner = st.text_input("Owner", value=row["owner"] or "")
+                new_status = st.selectbox("Status", STATUSES, index=STATUS_IDX.get(row["status"], 0))
+                new_value = st.number_input("Deal Value", min_value=0.0, step=100.0, value=float(row["value"] or 0))
+                new_preferred_datetime = st.datetime_input("Preferred Date & Time", value=pd.to_datetime(row["preferred_datetime"]) if row["preferred_datetime"] else datetime.utcnow())
+                new_tags = st.text_input("Tags", value=row["tags"] or "")
+                new_notes = st.text_area("Notes", value=row["notes"] or "")
+                save_changes = st.form_submit_button("💾 Save Changes")
+                if save_changes:
+                    edited = {
+                        "name": new_name,
+                        "email": new_email,
+                        "phone": new_phone,
+                        "place": new_place,
+                        "source": new_source,
+                        "owner": new_owner,
+                        "status": new_status,
+                        "value": new_value,
+                        "preferred_datetime": new_preferred_datetime.isoformat() if new_preferred_datetime else None,
+                        "tags": new_tags,
+                        "notes": new_notes
+                    }
+                    # Only write the columns that actually changed (empty inputs match NULLs)
+                    update_lead(int(row["id"]), {
+                        k: v for k, v in edited.items()
+                        if v != row[k] and not (v == "" and row[k] is None)
+                    })
+                    st.success(f"Updated lead: {new_name}")
+                    st.rerun()
 
 # --- Analytics Tab ---
 with tab2:
     st.subheader("Analytics")
-    df_all = fetch_leads()
-    if df_all.empty:
+    by_status = analytics_summary()
+    if by_status.empty:
         st.info("No data for analytics.")
     else:
-        st.bar_chart(df_all["status"].value_counts())
-        st.bar_chart(df_all.groupby("status")["value"].sum())
+        st.bar_chart(by_status["leads"])
+        st.bar_chart(by_status["value"])
 
 # --- Import/Export Tab ---
 with tab3:
     st.subheader("Export")
     df_all = fetch_leads()
     if not df_all.empty:
-        st.download_button("⬇️ Download CSV", df_all.to_csv(index=False), "leads.csv")
-        st.download_button("⬇️ Download Excel", df_all.to_excel("leads.xlsx", index=False), "leads.xlsx")
+        st.download_button("⬇️ Download CSV", export_csv(df_all), "leads.csv", "text/csv")
+        st.download_button(
+            "⬇️ Download Excel",
+            export_xlsx(df_all),
+            "leads.xlsx",
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
 
     st.subheader("Import")
     file = st.file_uploader("Upload file", type=["csv", "xlsx"])
@@ -245,17 +443,11 @@ with tab3:
             else:
                 new = pd.read_excel(file)
 
-            with closing(sqlite3.connect(DB_PATH)) as conn:
-                existing_refs = pd.read_sql_query("SELECT ref_number FROM leads", conn)["ref_number"].tolist()
-                if "ref_number" in new.columns:
-                    new = new[~new["ref_number"].isin(existing_refs)]
-                else:
-                    # Assign new ref_numbers if missing
-                    new["ref_number"] = [str(uuid.uuid4())[:8].upper() for _ in range(len(new))]
-
-                new.to_sql("leads", conn, if_exists="append", index=False)
+            # Rows whose ref_number already exists are skipped by the UNIQUE index
+            added, nameless = import_leads(new)
 
-            st.success("File imported successfully (duplicates skipped)")
+            st.success(f"Imported {added} lead(s), skipped {len(new) - added - nameless} duplicate(s)"
+                       + (f" and {nameless} row(s) without a name" if nameless else ""))
             st.rerun()
         except Exception as e:
             st.error(f"Import failed: {e}")